@@ -1,7 +1,56 @@
+import math
+
 import streamlit as st
 import numpy as np
-import plotly.graph_objects as go
-from io import BytesIO
+
+# Optional numba acceleration – the JIT kernel fuses the per-point math into a
+# single SIMD-friendly loop with no temporary arrays, which matters when the
+# solver is called repeatedly (e.g. animation sweeps). Falls back to NumPy.
+try:
+    from numba import njit
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+
+# Optional numexpr acceleration – fuses the solver's array expressions into a
+# single streaming pass with no intermediate temporaries, for installs that
+# have numexpr but not numba.
+try:
+    import numexpr as ne
+    _HAVE_NUMEXPR = True
+except ImportError:
+    _HAVE_NUMEXPR = False
+
+# Optional JAX acceleration – the batched animation solve is a textbook vmap
+# over parameters, and XLA fuses the whole sweep into one compiled kernel.
+# Falls back to the NumPy broadcast path.
+try:
+    import jax
+    import jax.numpy as jnp
+    jax.config.update("jax_enable_x64", True)
+    _HAVE_JAX = True
+except ImportError:
+    _HAVE_JAX = False
+
+_REGIME_LABELS = ("Underdamped", "Critically Damped", "Overdamped")
+_REGIME_LABELS_ARR = np.array(_REGIME_LABELS)
+
+# Single classification point for the discriminant Δ = b² - 4mk, used by the
+# sidebar, the Add Trace label and the animation frames. Accepts a scalar or
+# an array of discriminants – sign(Δ)+1 indexes straight into the label array.
+def classify_damping(delta):
+    sign = np.where(np.isclose(delta, 0.0), 0, np.sign(delta)).astype(int)
+    labels = _REGIME_LABELS_ARR[sign + 1]
+    return labels if np.ndim(delta) else str(labels)
+
+# Module scope (not a closure recreated per rerun); highlights parameters that
+# changed relative to the previously stored trace.
+def fmt_param(prev_params, key, val):
+    # Scalar abs() instead of np.isclose – these are Python floats and
+    # ufunc dispatch is pure overhead on a button-press path.
+    prev = prev_params.get(key)
+    changed = prev is not None and abs(prev - val) > 1e-9
+    return f"**{key}={val:.2f}**" if changed else f"{key}={val:.2f}"
 
 st.set_page_config(page_title="Mass-Spring Damping Explorer", layout="wide")
 
@@ -22,111 +71,312 @@ x0 = st.sidebar.slider("Initial position (x₀)", min_value=-10.0, max_value=10.
 v0 = st.sidebar.slider("Initial velocity (v₀)", min_value=-10.0, max_value=10.0, value=0.0, step=0.1)
 t_max = st.sidebar.slider("Duration (s)", min_value=2.0, max_value=30.0, value=10.0, step=1.0)
 # --- Discriminant Display ---
+# Computed once per rerun; the Add Trace block reuses these same values.
 discriminant = b**2 - 4 * m * k
-damping_type = (
-    "Overdamped" if discriminant > 0 else
-    "Critically Damped" if discriminant == 0 else
-    "Underdamped"
-)
+disc_label = classify_damping(discriminant)
 
 st.sidebar.markdown("### Damping Info")
 st.sidebar.latex(r"\Delta = b^2 - 4mk")
 st.sidebar.write(f"Discriminant: **{discriminant:.3f}**")
-st.sidebar.write(f"Damping type: **{damping_type}**")
+st.sidebar.write(f"Damping type: **{disc_label}**")
 
-# # Sidebar – Animation Controls
-# st.sidebar.header("Optional: Animate Parameter")
+# Cap how many stored traces the main chart renders – browser-side cost per
+# rerun stays bounded no matter how many comparisons are accumulated. Storage
+# and export are unaffected.
+max_traces = st.sidebar.slider("Max traces shown", min_value=5, max_value=50, value=20, step=1)
 
-# animate_param = st.sidebar.selectbox("Animate which parameter?", ["None", "b", "m", "k", "x₀", "v₀"])
-# if animate_param != "None":
-#     anim_min = st.sidebar.number_input(f"Min value for {animate_param}", value=1.0)
-#     anim_max = st.sidebar.number_input(f"Max value for {animate_param}", value=10.0)
-#     animate = st.sidebar.button("🎞️ Animate")
-# else:
-#     animate = False
+# Sidebar – Animation Controls
+st.sidebar.header("Optional: Animate Parameter")
 
-# Time array
-t = np.linspace(0, t_max, 600)
-
-# Damped oscillator solver
-def solve_damped_oscillator(m, k, b, x0, v0, t):
-    omega0 = np.sqrt(k / m)
+animate_param = st.sidebar.selectbox("Animate which parameter?", ["None", "b", "m", "k", "x₀", "v₀"])
+if animate_param != "None":
+    anim_min = st.sidebar.number_input(f"Min value for {animate_param}", value=1.0)
+    anim_max = st.sidebar.number_input(f"Max value for {animate_param}", value=10.0)
+    animate = st.sidebar.button("🎞️ Animate")
+else:
+    animate = False
+
+if _HAVE_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def _solve_kernel(m, k, b, x0, v0, t, out):
+        """Fill `out` with x(t) and return the regime: 0 under, 1 critical, 2 over."""
+        omega0 = math.sqrt(k / m)
+        gamma = b / (2.0 * m)
+        # Same tolerance band as np.isclose(gamma, omega0, rtol=1e-9) below.
+        if abs(gamma - omega0) <= 1e-8 + 1e-9 * abs(omega0):
+            c1 = v0 + gamma * x0
+            for i in range(t.shape[0]):
+                out[i] = math.exp(-gamma * t[i]) * (x0 + c1 * t[i])
+            return 1
+        if gamma > omega0:
+            delta = math.sqrt(gamma * gamma - omega0 * omega0)
+            r1 = -gamma + delta
+            r2 = -gamma - delta
+            A = (v0 - r2 * x0) / (r1 - r2)
+            B = (r1 * x0 - v0) / (r1 - r2)
+            for i in range(t.shape[0]):
+                out[i] = A * math.exp(r1 * t[i]) + B * math.exp(r2 * t[i])
+            return 2
+        omega_d = math.sqrt(omega0 * omega0 - gamma * gamma)
+        D = (v0 + gamma * x0) / omega_d
+        for i in range(t.shape[0]):
+            out[i] = math.exp(-gamma * t[i]) * (
+                x0 * math.cos(omega_d * t[i]) + D * math.sin(omega_d * t[i])
+            )
+        return 0
+
+# Shared time grid – cached per t_max so every rerun and every stored trace at
+# the same duration reuses one array instead of reallocating/copying it.
+@st.cache_data
+def time_grid(t_max, n=600):
+    return np.linspace(0, t_max, n)
+
+# Damped oscillator solver – cached so reruns triggered by unrelated widgets
+# (title textbox, buttons) don't recompute the solution for identical parameters.
+# The time array is built inside (keyed on t_max) rather than passed in, since
+# hashing a 600-point array on every rerun would defeat the point of the cache.
+@st.cache_data(max_entries=128)
+def solve_damped_oscillator(m, k, b, x0, v0, t_max):
+    # math.sqrt on Python floats skips NumPy's ufunc dispatch; keep np.* only
+    # for the array work on t.
+    omega0 = math.sqrt(k / m)
     gamma = b / (2 * m)
 
-    if gamma > omega0:  # overdamped
-        delta = np.sqrt(gamma**2 - omega0**2)
+    # Sample just densely enough for the fastest rate in the signal (~8 points
+    # per radian of oscillation or decay); a flat overdamped tail doesn't need
+    # 600 points computed, serialized and rendered.
+    n = min(600, max(120, int(t_max * max(omega0, gamma) * 8)))
+    t = time_grid(t_max, n)
+
+    if _HAVE_NUMBA:
+        x = np.empty_like(t)
+        regime = _solve_kernel(m, k, b, x0, v0, t, x)
+        return t, x, _REGIME_LABELS[regime]
+
+    # Exact equality is essentially never hit with float sliders; without a
+    # tolerance band, near-critical parameters fall through to the underdamped
+    # branch where omega_d → 0 blows up the D coefficient.
+    if np.isclose(gamma, omega0, rtol=1e-9):  # critically damped
+        x = np.exp(-gamma * t) * (x0 + (v0 + gamma * x0) * t)
+        damping_type = "Critically Damped"
+    elif gamma > omega0:  # overdamped
+        delta = math.sqrt(gamma * gamma - omega0 * omega0)
         r1 = -gamma + delta
         r2 = -gamma - delta
         A = (v0 - r2 * x0) / (r1 - r2)
         B = (r1 * x0 - v0) / (r1 - r2)
-        x = A * np.exp(r1 * t) + B * np.exp(r2 * t)
+        if _HAVE_NUMEXPR:
+            x = ne.evaluate("A * exp(r1 * t) + B * exp(r2 * t)")
+        else:
+            # exp(r2*t) = exp(r1*t) / exp(2*delta*t); one exp sweep reused for both roots
+            e1 = np.exp(r1 * t)
+            x = A * e1 + B * (e1 * np.exp(-2 * delta * t))
         damping_type = "Overdamped"
-    elif gamma == omega0:  # critically damped
-        x = np.exp(-gamma * t) * (x0 + (v0 + gamma * x0) * t)
-        damping_type = "Critically Damped"
     else:  # underdamped
-        omega_d = np.sqrt(omega0**2 - gamma**2)
+        omega_d = math.sqrt(omega0 * omega0 - gamma * gamma)
         C = x0
         D = (v0 + gamma * x0) / omega_d
-        x = np.exp(-gamma * t) * (C * np.cos(omega_d * t) + D * np.sin(omega_d * t))
+        if _HAVE_NUMEXPR:
+            x = ne.evaluate("exp(-gamma * t) * (C * cos(omega_d * t) + D * sin(omega_d * t))")
+        else:
+            # exp((-gamma + i*omega_d)*t) gives the decaying cos/sin pair in one
+            # transcendental sweep instead of separate exp, cos and sin passes.
+            z = np.exp((-gamma + 1j * omega_d) * t)
+            x = C * z.real + D * z.imag
         damping_type = "Underdamped"
 
-    return x, damping_type
+    return t, x, damping_type
+
+if _HAVE_JAX:
+    def _solve_one_jax(m, k, b, x0, v0, t):
+        """Branchless single-parameter-set solve, written for jit/vmap.
+
+        jnp.where evaluates both branches, so the regime-specific square roots
+        and divisors are clamped to keep the unselected branches finite.
+        """
+        omega0 = jnp.sqrt(k / m)
+        gamma = b / (2 * m)
+        crit = jnp.abs(gamma - omega0) <= 1e-8 + 1e-9 * jnp.abs(omega0)
+        over = (gamma > omega0) & ~crit
+
+        d2 = gamma * gamma - omega0 * omega0
+        env = jnp.exp(-gamma * t)
+
+        x_crit = env * (x0 + (v0 + gamma * x0) * t)
+
+        delta = jnp.where(over, jnp.sqrt(jnp.maximum(d2, 0.0)), 1.0)
+        r1 = -gamma + delta
+        r2 = -gamma - delta
+        A = (v0 - r2 * x0) / (r1 - r2)
+        B = (r1 * x0 - v0) / (r1 - r2)
+        x_over = A * jnp.exp(r1 * t) + B * jnp.exp(r2 * t)
+
+        omega_d = jnp.where(crit | over, 1.0, jnp.sqrt(jnp.maximum(-d2, 0.0)))
+        D = (v0 + gamma * x0) / omega_d
+        x_under = env * (x0 * jnp.cos(omega_d * t) + D * jnp.sin(omega_d * t))
+
+        return jnp.where(crit, x_crit, jnp.where(over, x_over, x_under))
+
+    _solve_batch_jax = jax.jit(jax.vmap(_solve_one_jax, in_axes=(0, 0, 0, 0, 0, None)))
+
+# Batched solver for animation sweeps – takes (n_frames,) parameter arrays and
+# returns an (n_frames, len(t)) displacement matrix from one broadcast pass per
+# damping regime, instead of one Python-level solver call per frame.
+def solve_damped_oscillator_batch(m, k, b, x0, v0, t):
+    m, k, b, x0, v0 = np.broadcast_arrays(m, k, b, x0, v0)
+
+    if _HAVE_JAX:
+        # First call pays XLA compilation; repeated sweeps take microseconds.
+        return np.asarray(_solve_batch_jax(m, k, b, x0, v0, t))
+
+    omega0 = np.sqrt(k / m)
+    gamma = b / (2 * m)
+
+    crit = np.isclose(gamma, omega0, rtol=1e-9)
+    over = (gamma > omega0) & ~crit
+    under = ~(crit | over)
+
+    x = np.empty((gamma.size, t.size))
+    tt = t[None, :]
+
+    # Scratch blocks shared by the regimes below. Every array op writes into
+    # a slice of these via out=, so a full sweep allocates no transient
+    # (rows, n) temporaries regardless of how many frames are solved.
+    phase = np.empty_like(x)
+    env = np.empty_like(x)
+    cosv = np.empty_like(x)
+    sinv = np.empty_like(x)
+
+    if crit.any():
+        rows = int(crit.sum())
+        g = gamma[crit, None]
+        e, p = env[:rows], phase[:rows]
+        np.multiply(-g, tt, out=e)
+        np.exp(e, out=e)                                            # e = exp(-γt)
+        np.multiply((v0[crit] + gamma[crit] * x0[crit])[:, None], tt, out=p)
+        np.add(p, x0[crit, None], out=p)                            # p = x0 + (v0+γx0)t
+        np.multiply(e, p, out=p)
+        x[crit] = p
+    if over.any():
+        rows = int(over.sum())
+        g = gamma[over]
+        delta = np.sqrt(g * g - omega0[over] ** 2)
+        r1 = -g + delta
+        r2 = -g - delta
+        A = (v0[over] - r2 * x0[over]) / (r1 - r2)
+        B = (r1 * x0[over] - v0[over]) / (r1 - r2)
+        e, p = env[:rows], phase[:rows]
+        np.multiply(r1[:, None], tt, out=e)
+        np.exp(e, out=e)                                            # e = exp(r1 t)
+        np.multiply(r2[:, None], tt, out=p)
+        np.exp(p, out=p)                                            # p = exp(r2 t)
+        np.multiply(A[:, None], e, out=e)
+        np.multiply(B[:, None], p, out=p)
+        np.add(e, p, out=e)
+        x[over] = e
+    if under.any():
+        rows = int(under.sum())
+        g = gamma[under]
+        omega_d = np.sqrt(omega0[under] ** 2 - g * g)
+        D = (v0[under] + g * x0[under]) / omega_d
+        p, e, c, s = phase[:rows], env[:rows], cosv[:rows], sinv[:rows]
+        np.multiply(omega_d[:, None], tt, out=p)                    # p = ω_d t
+        np.cos(p, out=c)
+        np.sin(p, out=s)
+        np.multiply(-g[:, None], tt, out=e)
+        np.exp(e, out=e)                                            # e = exp(-γt)
+        np.multiply(x0[under, None], c, out=c)
+        np.multiply(D[:, None], s, out=s)
+        np.add(c, s, out=c)
+        np.multiply(e, c, out=c)
+        x[under] = c
+
+    return x
 
 # Compute current solution
-x, damping_type = solve_damped_oscillator(m, k, b, x0, v0, t)
+t, x, damping_type = solve_damped_oscillator(m, k, b, x0, v0, t_max)
+
+# float32 is more than enough for on-screen plotting and halves the payload
+# serialized to the browser (and the per-trace session-state footprint).
+t32 = t.astype(np.float32)
+x32 = x.astype(np.float32)
 
-# Session state for traces
-if "traces" not in st.session_state:
-    st.session_state.traces = []
+# plotly's import chain is heavy (~300 ms); importing it only once the sidebar
+# and headline widgets are on screen takes it off the cold-start first paint.
+# Reruns find it in sys.modules, so this costs nothing afterwards.
+import plotly.graph_objects as go
+
+# Session state for traces, stored struct-of-arrays style: one contiguous
+# (n_traces, N_MAX) float32 matrix for the displacement rows (NaN-padded past
+# each trace's adaptive length, which Plotly skips), plus parallel lists of
+# parameter dicts and labels. trace_objs holds the prebuilt Scatter per stored
+# trace so reruns don't reconstruct N Scatter objects per slider tick; each
+# Scatter's y is a contiguous row view into the matrix.
+N_MAX = 600  # widest adaptive sample count
+
+if "X" not in st.session_state:
+    st.session_state.X = np.empty((0, N_MAX), dtype=np.float32)
+    st.session_state.trace_params = []
+    st.session_state.trace_labels = []
+    st.session_state.trace_objs = []
 
 # Buttons for adding and clearing traces
 col1, col2 = st.columns([1, 5])
 if col1.button("➕ Add Trace"):
-    delta = b**2 - 4 * m * k
-    damping_type = (
-        "Overdamped" if delta > 0 else
-        "Critically Damped" if np.isclose(delta, 0.0) else
-        "Underdamped"
-    )
-
-    current_params = dict(b=b, m=m, k=k, x0=x0, v0=v0, delta=delta, damping_type=damping_type)
+    # The sidebar already computed the discriminant and its classification
+    # for these exact slider values – reuse rather than recompute.
+    current_params = dict(b=b, m=m, k=k, x0=x0, v0=v0, delta=discriminant,
+                          damping_type=disc_label, t_max=t_max, n=int(x32.size))
 
     # Get previous parameters for comparison
-    if st.session_state.traces:
-        _, _, prev_params, _ = st.session_state.traces[-1]
+    if st.session_state.trace_params:
+        prev_params = st.session_state.trace_params[-1]
     else:
         prev_params = {}
 
-    # Format and highlight changed parameters
-    def fmt_param(key, val):
-        changed = key in prev_params and not np.isclose(prev_params[key], val)
-        return f"**{key}={val:.2f}**" if changed else f"{key}={val:.2f}"
-
     label = (
-        f"{damping_type} (Δ = {delta:.2f}) | " +
+        f"{disc_label} (Δ = {discriminant:.2f}) | " +
         ", ".join([
-            fmt_param("b", b),
-            fmt_param("m", m),
-            fmt_param("k", k),
-            fmt_param("x0", x0),
-            fmt_param("v0", v0)
+            fmt_param(prev_params, "b", b),
+            fmt_param(prev_params, "m", m),
+            fmt_param(prev_params, "k", k),
+            fmt_param(prev_params, "x0", x0),
+            fmt_param(prev_params, "v0", v0)
         ])
     )
 
-    # Store trace and full parameter set
-    st.session_state.traces.append((t.copy(), x.copy(), current_params, label))
+    # Append the new row (NaN-padded to N_MAX) to the contiguous matrix;
+    # t_max and n in the params are enough to rebuild each time grid from the
+    # cache, so no per-trace copy of t.
+    row = np.full(N_MAX, np.nan, dtype=np.float32)
+    row[:x32.size] = x32
+    st.session_state.X = np.vstack([st.session_state.X, row[None, :]])
+    st.session_state.trace_params.append(current_params)
+    st.session_state.trace_labels.append(label)
+
+    # vstack reallocated the matrix, so rebuild the prebuilt Scatters here
+    # (add time only) to keep each y a view into the live buffer.
+    X = st.session_state.X
+    st.session_state.trace_objs = [
+        go.Scatter(x=time_grid(p["t_max"], p["n"]).astype(np.float32), y=X[i, :p["n"]],
+                   mode="lines", name=lbl, line=dict(width=2, dash="dash"))
+        for i, (p, lbl) in enumerate(zip(st.session_state.trace_params, st.session_state.trace_labels))
+    ]
 
 if col2.button("🧹 Clear Traces"):
-    st.session_state.traces.clear()
-
-# Plot current and past traces
-fig = go.Figure()
+    st.session_state.X = np.empty((0, N_MAX), dtype=np.float32)
+    st.session_state.trace_params.clear()
+    st.session_state.trace_labels.clear()
+    st.session_state.trace_objs.clear()
 
-fig.add_trace(go.Scatter(x=t, y=x, mode="lines", name=f"Current ({damping_type})", line=dict(width=2)))
-
-for t_i, x_i, _, label in st.session_state.traces:
-    fig.add_trace(go.Scatter(x=t_i, y=x_i, mode="lines", name=label, line=dict(width=2, dash="dash")))
+# Plot current and past traces – only the "Current" Scatter is built per rerun,
+# and only the most recent max_traces stored traces are rendered.
+fig = go.Figure(data=[
+    go.Scatter(x=t32, y=x32, mode="lines", name=f"Current ({damping_type})", line=dict(width=2)),
+    *st.session_state.trace_objs[-max_traces:],
+])
+if len(st.session_state.trace_objs) > max_traces:
+    st.caption(f"Showing the {max_traces} most recent of {len(st.session_state.trace_objs)} stored traces.")
 
 
 fig.update_layout(
@@ -144,50 +394,74 @@ fig.update_layout(
     )
 )
 
-st.plotly_chart(fig, use_container_width=True)
+# Render through components.html with include_plotlyjs="cdn" rather than
+# st.plotly_chart: the browser fetches (and caches) plotly.js from the CDN
+# instead of receiving Streamlit's ~3 MB bundled copy on first paint. Costs
+# the Streamlit theme integration on this one chart.
+import streamlit.components.v1 as components
+
+components.html(fig.to_html(full_html=False, include_plotlyjs="cdn"), height=650)
 
 # PNG Export
 from plotly.graph_objs import Figure
 import socket
 from io import BytesIO
 
-# Detect whether the app is running on Streamlit Community Cloud
+# Detect whether the app is running on Streamlit Community Cloud – the
+# hostname can't change mid-session, so do the syscall once, not per rerun.
+@st.cache_resource
+def _is_cloud():
+    hostname = socket.gethostname().lower()
+    return "localhost" in hostname or "adminuser" in hostname
 
-
-is_cloud = "localhost" in socket.gethostname().lower() or "adminuser" in socket.gethostname().lower()
+is_cloud = _is_cloud()
 
 #st.write(socket.gethostname().lower())
 
 custom_title = st.text_input("📛 Title for Exported Plot \n Notes: 1. Only *Added* traces are exported. You must hit Enter to save your title", "")
 
-# Create export figure (traces only)
-from plotly.graph_objs import Figure
-
-export_fig = Figure()
-export_fig.update_layout(
-    title=custom_title,
-    xaxis_title="Time (s)",
-    yaxis_title="Displacement x(t)",
-    template="plotly_white",
-    width=1600,
-    height=800,
-    legend=dict(
-        orientation="v",
-        x=1.02,
-        xanchor="left",
-        y=1,
-        yanchor="top",
-        traceorder='normal',
-        font=dict(size=12),
-        itemsizing='constant'
+# Create export figure (traces only). Built from an immutable signature of the
+# stored traces so the expensive serialization below can be cached on it.
+def _build_export_fig(traces_sig, title):
+    export_fig = Figure()
+    export_fig.update_layout(
+        title=title,
+        xaxis_title="Time (s)",
+        yaxis_title="Displacement x(t)",
+        template="plotly_white",
+        width=1600,
+        height=800,
+        legend=dict(
+            orientation="v",
+            x=1.02,
+            xanchor="left",
+            y=1,
+            yanchor="top",
+            traceorder='normal',
+            font=dict(size=12),
+            itemsizing='constant'
+        )
     )
+    for tm_i, x_bytes, label in traces_sig:
+        x_i = np.frombuffer(x_bytes, dtype=np.float32)
+        export_fig.add_trace(go.Scatter(
+            x=time_grid(tm_i, x_i.size).astype(np.float32), y=x_i, mode="lines", name=label, line=dict(dash="dash")
+        ))
+    return export_fig
+
+# HTML serialization is skipped on reruns that don't touch the traces or the
+# title – the usual case for slider drags.
+@st.cache_data
+def build_export_html(traces_sig, title):
+    return _build_export_fig(traces_sig, title).to_html(full_html=False, include_plotlyjs="cdn")
+
+traces_sig = tuple(
+    (p["t_max"], st.session_state.X[i, :p["n"]].tobytes(), lbl)
+    for i, (p, lbl) in enumerate(zip(st.session_state.trace_params, st.session_state.trace_labels))
 )
 
-for t_i, x_i, _, label in st.session_state.traces:
-    export_fig.add_trace(go.Scatter(x=t_i, y=x_i, mode="lines", name=label, line=dict(dash="dash")))
-
 # HTML export (works everywhere)
-export_html = export_fig.to_html(full_html=False, include_plotlyjs="cdn")
+export_html = build_export_html(traces_sig, custom_title)
 st.download_button(
     "📄 Download Traces as Interactive HTML",
     data=export_html,
@@ -195,98 +469,107 @@ st.download_button(
     mime="text/html"
 )
 
+# Kaleido spawns a headless renderer to rasterize the figure – far too
+# expensive to run on every rerun, so the PNG is only built on explicit
+# request (and cached on the same signature as the HTML export).
+@st.cache_data
+def build_export_png(traces_sig, title):
+    buf = BytesIO()
+    _build_export_fig(traces_sig, title).write_image(buf, format="png", width=1600, height=800)
+    return buf.getvalue()
+
 # PNG export only locally
 if not is_cloud:
-    buf = BytesIO()
-    export_fig.write_image(buf, format="png", width=1600, height=800)
-    st.download_button(
-        "📥 Download Traces as PNG (High Res)",
-        data=buf.getvalue(),
-        file_name="oscillator_plot.png",
-        mime="image/png"
-    )
+    if st.button("🖨️ Prepare PNG (High Res)"):
+        st.session_state.png_bytes = build_export_png(traces_sig, custom_title)
+    if st.session_state.get("png_bytes") is not None:
+        st.download_button(
+            "📥 Download Traces as PNG (High Res)",
+            data=st.session_state.png_bytes,
+            file_name="oscillator_plot.png",
+            mime="image/png"
+        )
 else:
     st.info("🖼️ PNG export is only available when running locally. \
 To use this feature, click the GitHub icon (top-right) to access the repository and run the app on your machine.")
 
 
 
-# if animate:
-#     n_frames = 60
-#     anim_values = np.linspace(anim_min, anim_max, n_frames)
-#     slider_steps = []
-#     param_key = animate_param if animate_param != "x₀" else "x0"
-
-#     # Initial arguments
-#     args = dict(b=b, m=m, k=k, x0=x0, v0=v0)
-
-#     # Set initial value for animated parameter
-#     args[param_key] = anim_values[0]
-#     x_init, _ = solve_damped_oscillator(args["m"], args["k"], args["b"], args["x0"], args["v0"], t)
-
-#     # Initial discriminant
-#     D_init = args["b"]**2 - 4 * args["m"] * args["k"]
-
-#     fig_title = (
-#         f"Animation: Varying {animate_param} = {anim_values[0]:.2f} | "
-#         f"m={args['m']}, k={args['k']}, b={args['b']}, x₀={args['x0']}, v₀={args['v0']} | "
-#         f"Δ = {D_init:.3f}"
-#     )
-
-#     anim_fig = go.Figure(
-#         data=[go.Scatter(x=t, y=x_init, mode="lines", name="")],
-#         layout=go.Layout(
-#             title=fig_title,
-#             xaxis_title="Time (s)",
-#             yaxis_title="Displacement x(t)",
-#             updatemenus=[{
-#                 "type": "buttons",
-#                 "showactive": False,
-#                 "buttons": [
-#                     {"label": "▶️ Play", "method": "animate", "args": [None, {"frame": {"duration": 50, "redraw": True}, "fromcurrent": True}]},
-#                     {"label": "⏸️ Pause", "method": "animate", "args": [[None], {"frame": {"duration": 0}, "mode": "immediate"}]}
-#                 ]
-#             }]
-#         )
-#     )
-
-#     frames_list = []
-
-#     for val in anim_values:
-#         args[param_key] = val
-#         x_anim, _ = solve_damped_oscillator(args["m"], args["k"], args["b"], args["x0"], args["v0"], t)
-#         D = args["b"]**2 - 4 * args["m"] * args["k"]
-
-#         title = (
-#             f"Animation: Varying {animate_param} = {val:.2f} | "
-#             f"m={args['m']:.2f}, k={args['k']:.2f}, b={args['b']:.2f}, x₀={args['x0']:.2f}, v₀={args['v0']:.2f} | "
-#             f"Δ = {D:.3f}"
-#         )
-
-#         frame = go.Frame(
-#             data=[go.Scatter(x=t, y=x_anim, mode="lines", name="")],
-#             name=f"{val:.4f}",
-#             layout=go.Layout(title=title)
-#         )
-#         frames_list.append(frame)
-
-#         slider_steps.append({
-#             "method": "animate",
-#             "args": [[f"{val:.4f}"], {"mode": "immediate", "frame": {"duration": 0}, "transition": {"duration": 0}}],
-#             "label": f"{val:.2f}"
-#         })
-
-#     anim_fig.frames = frames_list
-
-#     anim_fig.update_layout(
-#         sliders=[{
-#             "active": 0,
-#             "currentvalue": {"prefix": f"{animate_param} = "},
-#             "pad": {"t": 50},
-#             "steps": slider_steps
-#         }],
-#         height=600,
-#         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
-#     )
-
-#     st.plotly_chart(anim_fig, use_container_width=True)
+if animate:
+    n_frames = 60
+    anim_values = np.linspace(anim_min, anim_max, n_frames)
+    slider_steps = []
+    param_key = {"x₀": "x0", "v₀": "v0"}.get(animate_param, animate_param)
+
+    # Broadcast the constant parameters against the animated sweep and solve
+    # every frame in one batched call.
+    args = dict(b=np.full(n_frames, b), m=np.full(n_frames, m), k=np.full(n_frames, k),
+                x0=np.full(n_frames, x0), v0=np.full(n_frames, v0))
+    args[param_key] = anim_values
+    x_all = solve_damped_oscillator_batch(
+        args["m"], args["k"], args["b"], args["x0"], args["v0"], t
+    ).astype(np.float32)
+
+    # Discriminant and damping regime per frame, classified in one shot
+    D_all = args["b"]**2 - 4 * args["m"] * args["k"]
+    regimes = classify_damping(D_all)
+
+    fig_title = (
+        f"Animation: Varying {animate_param} = {anim_values[0]:.2f} | "
+        f"m={args['m'][0]}, k={args['k'][0]}, b={args['b'][0]}, x₀={args['x0'][0]}, v₀={args['v0'][0]} | "
+        f"Δ = {D_all[0]:.3f} ({regimes[0]})"
+    )
+
+    anim_fig = go.Figure(
+        data=[go.Scatter(x=t32, y=x_all[0], mode="lines", name="")],
+        layout=go.Layout(
+            title=fig_title,
+            xaxis_title="Time (s)",
+            yaxis_title="Displacement x(t)",
+            updatemenus=[{
+                "type": "buttons",
+                "showactive": False,
+                "buttons": [
+                    {"label": "▶️ Play", "method": "animate", "args": [None, {"frame": {"duration": 50, "redraw": True}, "fromcurrent": True}]},
+                    {"label": "⏸️ Pause", "method": "animate", "args": [[None], {"frame": {"duration": 0}, "mode": "immediate"}]}
+                ]
+            }]
+        )
+    )
+
+    frames_list = []
+
+    for j, val in enumerate(anim_values):
+        title = (
+            f"Animation: Varying {animate_param} = {val:.2f} | "
+            f"m={args['m'][j]:.2f}, k={args['k'][j]:.2f}, b={args['b'][j]:.2f}, x₀={args['x0'][j]:.2f}, v₀={args['v0'][j]:.2f} | "
+            f"Δ = {D_all[j]:.3f} ({regimes[j]})"
+        )
+
+        frame = go.Frame(
+            data=[go.Scatter(x=t32, y=x_all[j], mode="lines", name="")],
+            name=f"{val:.4f}",
+            layout=go.Layout(title=title)
+        )
+        frames_list.append(frame)
+
+        slider_steps.append({
+            "method": "animate",
+            "args": [[f"{val:.4f}"], {"mode": "immediate", "frame": {"duration": 0}, "transition": {"duration": 0}}],
+            "label": f"{val:.2f}"
+        })
+
+    anim_fig.frames = frames_list
+
+    anim_fig.update_layout(
+        sliders=[{
+            "active": 0,
+            "currentvalue": {"prefix": f"{animate_param} = "},
+            "pad": {"t": 50},
+            "steps": slider_steps
+        }],
+        height=600,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
+    )
+
+    st.plotly_chart(anim_fig, use_container_width=True)